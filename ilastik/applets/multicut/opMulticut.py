@@ -1,9 +1,12 @@
+import functools
+import math
 import warnings
 
 import numpy as np
 
 from lazyflow.graph import Operator, InputSlot, OutputSlot
 from lazyflow.operators import OpBlockedArrayCache, OpValueCache
+from lazyflow.request import RequestLock
 from lazyflow.utility import Timer
 
 import nifty
@@ -90,7 +93,13 @@ class OpProjectNodeLabeling(Operator):
     def execute(self, slot, subindex, roi, result):
         mapping_index_array = self.NodeLabels.value
         self.Superpixels(roi.start, roi.stop).writeInto(result).wait()
-        result[:] = mapping_index_array[result]
+        # Look up the labels directly into result instead of fancy-indexing
+        # into a temporary volume and copying that over.
+        # take() needs matching dtypes for out, converting the mapping is cheap.
+        # mode="raise" buffers out internally, but superpixel ids beyond the node labeling
+        # (e.g. labels older than the superpixels) must fail instead of mapping to the last segment.
+        mapping_index_array = mapping_index_array.astype(result.dtype, copy=False)
+        np.take(mapping_index_array, result, out=result, mode="raise")
 
     def propagateDirty(self, slot, subindex, roi):
         if slot is self.Superpixels:
@@ -128,7 +137,10 @@ class OpEdgeLabelDisagreementDict(Operator):
 
         # 0: edge is "inactive", nodes belong to the same segment
         # 1: edge is "active", nodes belong to separate segments
-        edge_labels_from_nodes = (node_labels[edge_ids[:, 0]] != node_labels[edge_ids[:, 1]]).view(np.uint8)
+        # Gather the labels of both endpoints at once, indexing with the contiguous
+        # (N, 2) edge_ids instead of its two strided columns.
+        edge_node_labels = node_labels[edge_ids]
+        edge_labels_from_nodes = (edge_node_labels[:, 0] != edge_node_labels[:, 1]).view(np.uint8)
         edge_labels_from_probabilities = edge_probabilities > 0.5
 
         conflicts = np.where(edge_labels_from_nodes != edge_labels_from_probabilities)
@@ -149,24 +161,69 @@ class OpMulticutAgglomerator(Operator):
     EdgeProbabilities = InputSlot()
     NodeLabels = OutputSlot()  # 1D array, mapping superpixels to segment labels
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The nifty graph of the last executed rag (compared by identity, the pair keeps it alive).
+        # The graph only depends on the rag, so changing e.g. Beta does not rebuild it.
+        self._graph_rag = None
+        self._graph = None
+        # Edge weights of the last execute, and the (rag, edge_probabilities, beta, threshold)
+        # they were computed from. They are reused as long as these inputs are the same,
+        # i.e. changing only SolverName does not recompute them. Otherwise the buffer is
+        # reused for the new weights if the number of edges didn't change.
+        self._edge_weights = None
+        self._edge_weights_inputs = None
+        # Guards the above, executes share the graph and the edge weights buffer.
+        self._lock = RequestLock()
+
     def setupOutputs(self):
         self.NodeLabels.meta.shape = (1,)
         self.NodeLabels.meta.dtype = object
 
     def execute(self, slot, subindex, roi, result):
-        rag = self.Rag.value
-        beta = self.Beta.value
-        solver_name = self.SolverName.value
-        edge_probabilities = self.EdgeProbabilities.value
-        if edge_probabilities is None:
-            # No probabilities cached yet. Merge everything
-            result[0] = np.zeros(rag.max_sp + 1, dtype=np.uint32)
-            return
-
-        with Timer() as timer:
-            node_labeling = self.agglomerate_with_multicut(
-                rag, edge_probabilities, beta, solver_name, self.ProbabilityThreshold.value
-            )
+        with self._lock:
+            # Read the inputs while holding the lock, so they can't change between
+            # reading them and checking them against the cached edge weights.
+            rag = self.Rag.value
+            beta = self.Beta.value
+            solver_name = self.SolverName.value
+            edge_probabilities = self.EdgeProbabilities.value
+            if edge_probabilities is None:
+                # No probabilities cached yet. Merge everything
+                result[0] = np.zeros(rag.max_sp + 1, dtype=np.uint32)
+                return
+
+            threshold = self.ProbabilityThreshold.value
+
+            if rag is not self._graph_rag:
+                self._graph = build_graph(rag.edge_ids, rag.max_sp + 1)
+                self._graph_rag = rag
+            graph = self._graph
+
+            cached_inputs = self._edge_weights_inputs
+            if (
+                cached_inputs is None
+                or cached_inputs[0] is not rag
+                or cached_inputs[1] is not edge_probabilities
+                or cached_inputs[2:] != (beta, threshold)
+            ):
+                # The buffer is overwritten, only mark it valid again once the computation succeeded.
+                self._edge_weights_inputs = None
+                self._edge_weights = compute_edge_weights(
+                    rag.edge_ids, edge_probabilities, beta, threshold, out=self._edge_weights
+                )
+                self._edge_weights_inputs = (rag, edge_probabilities, beta, threshold)
+
+            with Timer() as timer:
+                node_labeling = self.agglomerate_with_multicut(
+                    rag,
+                    edge_probabilities,
+                    beta,
+                    solver_name,
+                    threshold,
+                    graph=graph,
+                    edge_weights=self._edge_weights,
+                )
 
         logger.info(f"{solver_name!r} Multicut took {timer.seconds()} seconds")
 
@@ -176,10 +233,19 @@ class OpMulticutAgglomerator(Operator):
         result[0] = node_labeling
 
     def propagateDirty(self, slot, subindex, roi):
+        if slot is self.Rag:
+            self._graph_rag = None
+            self._graph = None
+        if slot is self.Rag or slot is self.EdgeProbabilities:
+            # Don't keep the previous rag and probabilities alive until the next execute
+            self._edge_weights_inputs = None
+            self._edge_weights = None
         self.NodeLabels.setDirty()
 
     @classmethod
-    def agglomerate_with_multicut(cls, rag, edge_probabilities, beta, solver_name, threshold):
+    def agglomerate_with_multicut(
+        cls, rag, edge_probabilities, beta, solver_name, threshold, graph=None, edge_weights=None
+    ):
         """
         rag: ilastikrag.Rag
 
@@ -190,6 +256,12 @@ class OpMulticutAgglomerator(Operator):
 
         solver_name: The multicut solver used. Format: library_solver (e.g. nifty_Exact)
 
+        graph: (optional) nifty graph of the rag, as returned by build_graph.
+               Built from rag.edge_ids if not given.
+
+        edge_weights: (optional) edge weights as returned by compute_edge_weights for the
+                      given edge_probabilities, beta and threshold. Computed if not given.
+
         Returns: An index array [0,1,...,N] indicating the new labels for the N nodes of the RAG.
         """
         #
@@ -197,16 +269,20 @@ class OpMulticutAgglomerator(Operator):
         #
         assert rag.edge_ids.shape == (rag.num_edges, 2)
         node_count = rag.max_sp + 1
+        if rag.num_edges == 0:
+            # e.g. a single superpixel: nothing to cut or merge, no need to call the solver.
+            return np.arange(node_count, dtype=np.uint32)
         #
         # Solve
         #
-        edge_weights = compute_edge_weights(rag.edge_ids, edge_probabilities, beta, threshold)
+        if edge_weights is None:
+            edge_weights = compute_edge_weights(rag.edge_ids, edge_probabilities, beta, threshold)
         assert edge_weights.shape == (rag.num_edges,)
 
-        return solve(rag.edge_ids, edge_weights, node_count, solver_name)
+        return solve(rag.edge_ids, edge_weights, node_count, solver_name, graph=graph)
 
 
-def compute_edge_weights(edge_ids, edge_probabilities, beta, threshold):
+def compute_edge_weights(edge_ids, edge_probabilities, beta, threshold, out=None):
     """
     Convert edge probabilities to energies for the multicut problem.
 
@@ -214,10 +290,14 @@ def compute_edge_weights(edge_ids, edge_probabilities, beta, threshold):
         The list of edges in the graph. shape=(N, 2)
     edge_probabilities:
         1-D, float (1.0 means edge is CUT, disconnecting the two SPs)
+        The returned weights have the same dtype (at least float32).
     beta:
         scalar (float)
     threshold:
         scalar (float), moves the 0 of the edge weights (default threshold = 0.5)
+    out:
+        (optional) 1-D array to write the edge weights into, e.g. the result of a previous call.
+        A new array is allocated if its shape or dtype do not fit.
 
     Special behavior:
         If any node has ID 0, all of it's edges will be given an
@@ -225,12 +305,32 @@ def compute_edge_weights(edge_ids, edge_probabilities, beta, threshold):
         neighbors, regardless of what the edge_probabilities say.
     """
 
+    # Keep float32 probabilities in float32, halving the memory traffic compared to float64.
+    dtype = np.result_type(edge_probabilities, np.float32)
+    if out is None or out.shape != edge_probabilities.shape or out.dtype != dtype:
+        out = np.empty(edge_probabilities.shape, dtype=dtype)
+
     # P(Edge=CUT), clipped to avoid log(0).
-    p1 = np.clip(edge_probabilities, 0.001, 0.999)
+    # out is the only float buffer used, all following steps work in-place on it.
+    # (minimum/maximum instead of np.clip, which is not a plain ufunc on older numpy versions)
+    p1 = np.minimum(edge_probabilities, 0.999, out=out)
+    np.maximum(p1, 0.001, out=p1)
     # Rescale [0; t] to [0; 0.5], and [t; 1] to [0.5; 1].
-    p1 = np.where(p1 <= threshold, p1 / (2 * threshold), 0.5 + (p1 - threshold) / (2 * (1 - threshold)))
+    # Both pieces are affine, so apply them through masks instead of evaluating
+    # both branches for all edges (as np.where would).
+    below_threshold = p1 <= threshold
+    np.multiply(p1, 0.5 / threshold, out=p1, where=below_threshold)
+    np.logical_not(below_threshold, out=below_threshold)
+    np.subtract(p1, threshold, out=p1, where=below_threshold)
+    np.multiply(p1, 0.5 / (1 - threshold), out=p1, where=below_threshold)
+    np.add(p1, 0.5, out=p1, where=below_threshold)
     # log((p0 / p1) + log((1-beta) / beta)), where p0 = 1 - p1 is P(Edge=NOT CUT).
-    edge_weights = np.log(np.reciprocal(p1) - 1) + np.log(1 / beta - 1)
+    # The beta term is a scalar, compute it once.
+    edge_weights = p1
+    np.reciprocal(edge_weights, out=edge_weights)
+    np.subtract(edge_weights, 1, out=edge_weights)
+    np.log(edge_weights, out=edge_weights)
+    np.add(edge_weights, math.log(1 / beta - 1), out=edge_weights)
 
     # See note special behavior, above
     edges_touching_zero = edge_ids[:, 0] == 0
@@ -242,41 +342,67 @@ def compute_edge_weights(edge_ids, edge_probabilities, beta, threshold):
     return edge_weights
 
 
-def solve(edge_ids, edge_weights, node_count, solver_method):
+def build_graph(edge_ids, node_count):
     """
-    Solve the given multicut problem with the 'Nifty' library and return an
-    index array that maps node IDs to segment IDs.
+    Build the nifty graph for a multicut problem.
 
     edge_ids: The list of edges in the graph. shape=(N, 2)
 
-    edge_weights: Edge energies. shape=(N,)
+    node_count: Number of nodes in the model (see solve)
+    """
+    g = nifty.graph.UndirectedGraph(int(node_count))
+    g.insertEdges(edge_ids)
+    return g
 
-    node_count: Number of nodes in the model.
-                Note: Must be greater than the max ID found in edge_ids.
-                      If your superpixel IDs are not consecutive, node_count should be max_sp_id+1
 
-    solver_method: see elf.segmentation.multicut.get_available_solver_names, also still supporting
-                   NIFTY_FmGreedy, the previous default solver.
+@functools.lru_cache(maxsize=None)
+def get_solver(solver_method):
+    """
+    Look up the solver function for solver_method (see solve).
+
+    The lookup queries elf for the available solvers, so it is memoized per solver_method.
     """
-    logging.debug(f"Using multicut solver {solver_method}")
     if solver_method in get_available_solver_names():
-        solver = get_multicut_solver(solver_method)
+        return get_multicut_solver(solver_method)
     elif solver_method == "Nifty_FmGreedy":
         # for backwards compatibility:
         warnings.warn(
             f"Using legacy multicut {solver_method}. This is only expected in debug mode or with old project files."
         )
-        solver = legacy_nifty_fm_greedy_solver
+        return legacy_nifty_fm_greedy_solver
     elif solver_method in LEGACY_SOLVER_NAMES:
-        ValueError(
+        raise ValueError(
             f"Multicut solver method {solver_method} not supported anymore. Please run the project in ilastik 1.3.3post3, or change the solver method in debug mode."
         )
     else:
         raise ValueError(f"Unsupported multicut solver method {solver_method}")
 
-    g = nifty.graph.UndirectedGraph(int(node_count))
-    g.insertEdges(edge_ids)
 
-    ret = solver(g, edge_weights)
-    mapping_index_array = ret.astype(np.uint32)
+def solve(edge_ids, edge_weights, node_count, solver_method, graph=None):
+    """
+    Solve the given multicut problem with the 'Nifty' library and return an
+    index array that maps node IDs to segment IDs.
+
+    edge_ids: The list of edges in the graph. shape=(N, 2)
+
+    edge_weights: Edge energies. shape=(N,)
+
+    node_count: Number of nodes in the model.
+                Note: Must be greater than the max ID found in edge_ids.
+                      If your superpixel IDs are not consecutive, node_count should be max_sp_id+1
+
+    solver_method: see elf.segmentation.multicut.get_available_solver_names, also still supporting
+                   NIFTY_FmGreedy, the previous default solver.
+
+    graph: (optional) nifty graph, as returned by build_graph(edge_ids, node_count).
+           Pass it to avoid rebuilding the graph when solving repeatedly for the same edges.
+    """
+    logging.debug(f"Using multicut solver {solver_method}")
+    solver = get_solver(solver_method)
+
+    if graph is None:
+        graph = build_graph(edge_ids, node_count)
+
+    ret = solver(graph, edge_weights)
+    mapping_index_array = ret.astype(np.uint32, copy=False)
     return mapping_index_array
@@ -321,9 +321,10 @@ class WsdtGui(LayerViewerGui):
 
         # Debug layers
         if op.debug_results:
+            # All debug images share the same axes, so compute the permutation only once
+            axiskeys = op.Superpixels.meta.getAxisKeys()[:-1]  # debug images don't have a channel axis
+            permutation = tuple(axiskeys.index(key) if key in axiskeys else None for key in "txyzc")
             for name, compressed_array in list(op.debug_results.items()):
-                axiskeys = op.Superpixels.meta.getAxisKeys()[:-1]  # debug images don't have a channel axis
-                permutation = [axiskeys.index(key) if key in axiskeys else None for key in "txyzc"]
                 arraysource = ArraySource(TransposedView(compressed_array, permutation))
                 if compressed_array.dtype == np.uint32:
                     layer = ColortableLayer(arraysource, self._sp_colortable)
@@ -18,9 +18,24 @@
 # on the ilastik web site at:
 #        http://ilastik.org/license.html
 ###############################################################################
-import numpy
+import threading
 import typing
 
+import numpy
+
+# dtype.kind of signed and unsigned integers
+_INTEGER_KINDS = frozenset("iu")
+
+_thread_local = threading.local()
+
+
+def _get_rng() -> numpy.random.Generator:
+    """Per-thread random generator, Generator instances must not be shared between threads"""
+    rng = getattr(_thread_local, "rng", None)
+    if rng is None:
+        rng = _thread_local.rng = numpy.random.default_rng()
+    return rng
+
 
 class DtypeConvertFunction:
     """Data-type conversion and rescaling function class
@@ -33,34 +48,101 @@ class DtypeConvertFunction:
     When using this function as an input for OpPixelOperator.Function, changing
     the input value to the same conversion function will not result in
     dirtyness.
+
+    Instances are interned per (dtype, dither, rescale), so constructing the
+    same conversion twice yields the identical object.
     """
 
-    def __init__(self, dtype: numpy.typing.DTypeLike):
+    _cache: typing.Dict[typing.Tuple[numpy.dtype, bool, bool], "DtypeConvertFunction"] = {}
+
+    def __new__(cls, dtype: numpy.typing.DTypeLike, dither: bool = False, rescale: bool = True):
+        key = (numpy.dtype(dtype), bool(dither), bool(rescale))
+        instance = cls._cache.get(key)
+        if instance is None:
+            instance = cls._cache.setdefault(key, super().__new__(cls))
+        return instance
+
+    def __init__(self, dtype: numpy.typing.DTypeLike, dither: bool = False, rescale: bool = True):
         """
         Args:
             dtype (numpy.dtype): dtype to which this functions __call__ will
               convert.
+            dither (bool): when converting float input to an integer dtype,
+              add uniform noise in [-0.5, 0.5) before rounding. This rounds
+              stochastically, so the expected output value matches the input
+              instead of being snapped to the nearest level, which avoids
+              banding in smooth gradients.
+            rescale (bool): for integer dtypes, map input values from [0, 1]
+              onto the dtype range. If False, values are cast as they are,
+              and integer input of the same itemsize is reinterpreted as a
+              view without copying.
         """
+        if getattr(self, "_initialized", False):
+            return
+
         self._dtype = numpy.dtype(dtype)
+        self._dither = bool(dither)
+        self._rescale = bool(rescale)
+        # Everything that determines the conversion, used for interning, equality and hashing
+        self._key = (self._dtype, self._dither, self._rescale)
+
+        if self._dtype.kind in _INTEGER_KINDS and not self._rescale:
+            itemsize = self._dtype.itemsize
 
-        if self._dtype.char in numpy.typecodes["AllInteger"]:
+            def cast(x):
+                if x.dtype.kind in _INTEGER_KINDS and x.dtype.itemsize == itemsize:
+                    # Same values as astype, but zero-copy
+                    return x.view(dtype)
+                return x.astype(dtype, copy=False)
+
+            self._fun = cast
+        elif self._dtype.kind in _INTEGER_KINDS:
             # For integer dtype scale according to dtype min and max to maximize precision
+            # [0, 1] is mapped onto [min, max]
             dtype_info = numpy.iinfo(dtype)
-            min_val = dtype_info.min
-            max_val = dtype_info.max
-            self._fun = lambda x: ((max_val - min_val) * x - min_val).astype(dtype)
+            scale = dtype_info.max - dtype_info.min
+            shift = dtype_info.min
+            # float32 represents integers exactly only up to 2**24, wider targets need float64
+            work_dtype = numpy.float64 if dtype_info.bits > 24 else numpy.float32
+            # Clip bounds representable in the scratch dtype, without rounding past the target range:
+            # e.g. the uint64 maximum would round up to 2**64 in float64 and wrap around in the cast.
+            lower = work_dtype(dtype_info.min)
+            upper = work_dtype(dtype_info.max)
+            if int(upper) > dtype_info.max:
+                upper = numpy.nextafter(upper, work_dtype(0))
+
+            def scale_to_range(x):
+                # All steps work in place on a single float scratch array
+                scaled = numpy.empty(numpy.shape(x), dtype=numpy.result_type(x, work_dtype))
+                numpy.multiply(x, scale, out=scaled)
+                numpy.add(scaled, shift, out=scaled)
+                if dither and scaled.dtype.kind == "f" and numpy.result_type(x).kind == "f":
+                    scaled += _get_rng().random(scaled.shape, dtype=numpy.float32)
+                    scaled -= 0.5
+                # Round to nearest and saturate, instead of truncating and wrapping around in the cast
+                numpy.clip(scaled, lower, upper, out=scaled)
+                numpy.rint(scaled, out=scaled)
+                return scaled.astype(dtype, casting="unsafe")
+
+            self._fun = scale_to_range
         else:
             # For floating points, just coerce it to the new floating point dtype.
-            self._fun = lambda x: x.astype(dtype)
+            # Input that already has the target dtype is passed through without copying.
+            self._fun = lambda x: x.astype(dtype, copy=False)
+
+        self._initialized = True
+
+    def __reduce__(self):
+        # Unpickling/copying has to go through __new__ to hit the cache
+        return (type(self), self._key)
 
     def __eq__(self, other: typing.Any) -> bool:
-        if other is None:
-            return False
-        if not isinstance(other, DtypeConvertFunction):
-            return False
-        if self._dtype == other._dtype:
+        if other is self:
             return True
-        return False
+        return isinstance(other, DtypeConvertFunction) and self._key == other._key
+
+    def __hash__(self) -> int:
+        return hash(self._key)
 
     def __call__(self, val: numpy.ndarray) -> numpy.ndarray:
         return self._fun(val)
@@ -1341,6 +1341,20 @@ class RequestPool(object):
         self._unsubmitted_requests.append(req)
         req.owning_pool = self
 
+    def add_batch(self, fn, args_iterable):
+        """
+        Add one request per item of args_iterable to the pool, each calling fn(item).
+        Equivalent to calling add(Request(partial(fn, item))) for every item, but checks the
+        pool state once and extends the pending requests in a single step.
+        """
+        if self._started:
+            raise RequestPool.RequestPoolError("Attempted to add a request to a pool that was already started!")
+
+        requests = [Request(functools.partial(fn, args)) for args in args_iterable]
+        for req in requests:
+            req.owning_pool = self
+        self._unsubmitted_requests.extend(requests)
+
     def wait(self):
         """
         Launch all requests and return after they have all completed, including their callback handlers.
@@ -0,0 +1,212 @@
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy
+import pytest
+
+from lazyflow.graph import Graph
+from lazyflow.request import RequestError
+from lazyflow.utility import is_root_cause
+
+from ilastik.applets.multicut import opMulticut
+from ilastik.applets.multicut.opMulticut import (
+    OpMulticutAgglomerator,
+    OpProjectNodeLabeling,
+    compute_edge_weights,
+    get_solver,
+)
+
+
+def _reference_edge_weights(edge_ids, edge_probabilities, beta, threshold):
+    p1 = numpy.clip(edge_probabilities, 0.001, 0.999)
+    p1 = numpy.where(p1 <= threshold, p1 / (2 * threshold), 0.5 + (p1 - threshold) / (2 * (1 - threshold)))
+    edge_weights = numpy.log(numpy.reciprocal(p1) - 1) + numpy.log(1 / beta - 1)
+    edge_weights[edge_ids[:, 0] == 0] = -1000.0
+    return edge_weights
+
+
+@pytest.mark.parametrize("threshold", [0.01, 0.3, 0.5, 0.99])
+@pytest.mark.parametrize("beta", [0.01, 0.5, 0.7])
+def test_compute_edge_weights(beta, threshold):
+    rng = numpy.random.default_rng(42)
+    edge_ids = numpy.sort(rng.integers(0, 50, size=(100, 2), dtype=numpy.uint32), axis=1)
+    edge_probabilities = rng.random(100)
+    edge_probabilities[:3] = (0.0, 1.0, threshold)
+
+    edge_weights = compute_edge_weights(edge_ids, edge_probabilities, beta, threshold)
+
+    expected = _reference_edge_weights(edge_ids, edge_probabilities, beta, threshold)
+    numpy.testing.assert_allclose(edge_weights, expected)
+
+
+def test_compute_edge_weights_does_not_modify_input():
+    edge_ids = numpy.array([[1, 2], [2, 3]], dtype=numpy.uint32)
+    edge_probabilities = numpy.array([0.0, 0.7])
+
+    compute_edge_weights(edge_ids, edge_probabilities, 0.5, 0.5)
+
+    numpy.testing.assert_array_equal(edge_probabilities, [0.0, 0.7])
+
+
+def test_agglomerate_without_edges_skips_solver():
+    # Stand-in for the Rag of a single superpixel
+    rag = SimpleNamespace(num_edges=0, max_sp=1, edge_ids=numpy.zeros((0, 2), dtype=numpy.uint32))
+
+    node_labeling = OpMulticutAgglomerator.agglomerate_with_multicut(
+        rag, numpy.zeros((0,), dtype=numpy.float32), 0.5, "not-a-solver", 0.5
+    )
+
+    numpy.testing.assert_array_equal(node_labeling, [0, 1])
+
+
+@pytest.mark.parametrize("solver_method", ["Opengm_Exact", "not-a-solver"])
+def test_get_solver_unsupported(solver_method):
+    with pytest.raises(ValueError):
+        get_solver(solver_method)
+
+
+@pytest.mark.parametrize(
+    "input_dtype,expected_dtype",
+    [(numpy.float16, numpy.float32), (numpy.float32, numpy.float32), (numpy.float64, numpy.float64)],
+)
+def test_compute_edge_weights_dtype(input_dtype, expected_dtype):
+    edge_ids = numpy.array([[0, 1], [1, 2]], dtype=numpy.uint32)
+    edge_probabilities = numpy.array([0.2, 0.7], dtype=input_dtype)
+
+    edge_weights = compute_edge_weights(edge_ids, edge_probabilities, 0.5, 0.5)
+
+    assert edge_weights.dtype == expected_dtype
+
+
+def test_compute_edge_weights_reuses_out():
+    edge_ids = numpy.array([[1, 2], [2, 3]], dtype=numpy.uint32)
+    edge_probabilities = numpy.array([0.2, 0.7], dtype=numpy.float32)
+    out = numpy.empty((2,), dtype=numpy.float32)
+
+    edge_weights = compute_edge_weights(edge_ids, edge_probabilities, 0.5, 0.5, out=out)
+
+    assert edge_weights is out
+    numpy.testing.assert_allclose(edge_weights, compute_edge_weights(edge_ids, edge_probabilities, 0.5, 0.5))
+    assert compute_edge_weights(edge_ids[:1], edge_probabilities[:1], 0.5, 0.5, out=out) is not out
+
+
+def _make_rag(edge_ids):
+    # Stand-in for an ilastikrag.Rag
+    edge_ids = numpy.array(edge_ids, dtype=numpy.uint32)
+    return SimpleNamespace(num_edges=len(edge_ids), max_sp=int(edge_ids.max()), edge_ids=edge_ids)
+
+
+@pytest.fixture
+def agglomerator(monkeypatch):
+    """
+    OpMulticutAgglomerator with the graph construction and edge weight computation
+    wrapped to count calls, and a solver that just records what it was called with.
+    """
+    for name in ("build_graph", "compute_edge_weights"):
+        monkeypatch.setattr(opMulticut, name, mock.Mock(wraps=getattr(opMulticut, name)))
+
+    def solve(edge_ids, edge_weights, node_count, solver_method, graph=None):
+        return numpy.arange(node_count, dtype=numpy.uint32)
+
+    monkeypatch.setattr(opMulticut, "solve", mock.Mock(side_effect=solve))
+
+    op = OpMulticutAgglomerator(graph=Graph())
+    op.SolverName.setValue(opMulticut.DEFAULT_SOLVER_NAME)
+    op.Beta.setValue(0.5)
+    op.ProbabilityThreshold.setValue(0.5)
+    op.Rag.setValue(_make_rag([[1, 2], [2, 3], [1, 3]]))
+    op.EdgeProbabilities.setValue(numpy.array([0.1, 0.8, 0.4], dtype=numpy.float32))
+    return op
+
+
+def _last_solve_args(op):
+    edge_ids, edge_weights, _node_count, solver_method = opMulticut.solve.call_args.args
+    return edge_weights, solver_method, opMulticut.solve.call_args.kwargs["graph"]
+
+
+@pytest.mark.parametrize("slot_name, value", [("Beta", 0.3), ("ProbabilityThreshold", 0.2)])
+def test_agglomerator_recomputes_weights_on_parameter_change(agglomerator, slot_name, value):
+    agglomerator.NodeLabels.value
+    getattr(agglomerator, slot_name).setValue(value)
+    agglomerator.NodeLabels.value
+
+    assert opMulticut.compute_edge_weights.call_count == 2
+    assert opMulticut.build_graph.call_count == 1
+
+    rag = agglomerator.Rag.value
+    expected = compute_edge_weights(
+        rag.edge_ids,
+        agglomerator.EdgeProbabilities.value,
+        agglomerator.Beta.value,
+        agglomerator.ProbabilityThreshold.value,
+    )
+    edge_weights, _solver_method, _graph = _last_solve_args(agglomerator)
+    numpy.testing.assert_allclose(edge_weights, expected)
+
+
+def test_agglomerator_reuses_graph_and_weights_on_solver_change(agglomerator):
+    agglomerator.NodeLabels.value
+    first_edge_weights, _solver_method, first_graph = _last_solve_args(agglomerator)
+    first_edge_weights = first_edge_weights.copy()
+
+    agglomerator.SolverName.setValue("greedy-additive")
+    agglomerator.NodeLabels.value
+
+    assert opMulticut.compute_edge_weights.call_count == 1
+    assert opMulticut.build_graph.call_count == 1
+    edge_weights, solver_method, graph = _last_solve_args(agglomerator)
+    assert solver_method == "greedy-additive"
+    assert graph is first_graph
+    numpy.testing.assert_array_equal(edge_weights, first_edge_weights)
+
+
+def test_agglomerator_rebuilds_for_new_rag(agglomerator):
+    agglomerator.NodeLabels.value
+
+    new_rag = _make_rag([[1, 2], [2, 3], [3, 4], [1, 4]])
+    agglomerator.Rag.setValue(new_rag)
+    agglomerator.EdgeProbabilities.setValue(numpy.array([0.1, 0.8, 0.4, 0.9], dtype=numpy.float32))
+    node_labels = agglomerator.NodeLabels.value
+
+    assert opMulticut.build_graph.call_count == 2
+    assert opMulticut.compute_edge_weights.call_count == 2
+    edge_weights, _solver_method, _graph = _last_solve_args(agglomerator)
+    assert edge_weights.shape == (new_rag.num_edges,)
+    numpy.testing.assert_array_equal(node_labels, numpy.arange(new_rag.max_sp + 1))
+
+
+@pytest.mark.parametrize(
+    "slot_name, value",
+    [
+        ("Rag", _make_rag([[1, 2], [2, 3]])),
+        ("EdgeProbabilities", numpy.array([0.9, 0.2, 0.6], dtype=numpy.float32)),
+    ],
+)
+def test_agglomerator_releases_stale_inputs_on_dirty(agglomerator, slot_name, value):
+    agglomerator.NodeLabels.value
+    assert agglomerator._edge_weights_inputs is not None
+
+    getattr(agglomerator, slot_name).setValue(value)
+
+    # No references to the previous rag/probabilities are kept until the next execute
+    assert agglomerator._edge_weights_inputs is None
+    assert agglomerator._edge_weights is None
+
+
+def test_project_node_labeling():
+    op = OpProjectNodeLabeling(graph=Graph())
+    op.Superpixels.setValue(numpy.array([[1, 2], [3, 1]], dtype=numpy.uint32))
+    op.NodeLabels.setValue(numpy.array([0, 5, 5, 7], dtype=numpy.uint32))
+
+    numpy.testing.assert_array_equal(op.Output[:].wait(), [[5, 5], [7, 5]])
+
+
+def test_project_node_labeling_outdated_labels():
+    # e.g. frozen node labels that are older than the superpixels
+    op = OpProjectNodeLabeling(graph=Graph())
+    op.Superpixels.setValue(numpy.array([[1, 2], [3, 4]], dtype=numpy.uint32))
+    op.NodeLabels.setValue(numpy.array([0, 5, 5, 7], dtype=numpy.uint32))
+
+    with pytest.raises(RequestError) as exc_info:
+        op.Output[:].wait()
+    assert is_root_cause(IndexError, exc_info.value)
@@ -21,7 +21,6 @@
 from __future__ import print_function
 import os
 import sys
-import imp
 import numpy
 import vigra
 import h5py
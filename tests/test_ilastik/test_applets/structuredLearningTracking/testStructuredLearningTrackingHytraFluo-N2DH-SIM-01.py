@@ -112,14 +112,17 @@ class TestStructuredLearningTrackingHeadless(object):
         except ImportError as e:
             pytest.xfail("Structured learning tracking could not be imported. CPLEX is most likely missing: " + str(e))
 
-        args = " --project=" + self.PROJECT_FILE
-        args += " --headless"
-        args += " --export_source=Tracking-Result"
-        args += " --raw_data " + self.RAW_DATA_FILE + "/exported_data"
-        args += " --binary_image " + self.BINARY_SEGMENTATION_FILE + "/exported_data"
+        args = [
+            "--project=" + self.PROJECT_FILE,
+            "--headless",
+            "--export_source=Tracking-Result",
+            "--raw_data",
+            self.RAW_DATA_FILE + "/exported_data",
+            "--binary_image",
+            self.BINARY_SEGMENTATION_FILE + "/exported_data",
+        ]
 
-        sys.argv = ["ilastik.py"]  # Clear the existing commandline args so it looks like we're starting fresh.
-        sys.argv += args.split()
+        sys.argv = ["ilastik.py", *args]  # Clear the existing commandline args so it looks like we're starting fresh.
 
         # Start up the ilastik.py entry script as if we had launched it from the command line
         self.ilastik_startup.main()
@@ -142,16 +145,18 @@ class TestStructuredLearningTrackingHeadless(object):
         except ImportError as e:
             pytest.xfail("Hytra tracking pipeline couldn't be imported: " + str(e))
 
-        args = " --project=" + self.PROJECT_FILE
-        args += " --headless"
-
-        args += " --export_source=Plugin"
-        args += " --export_plugin=CSV-Table"
-        args += " --raw_data " + self.RAW_DATA_FILE  # + '/data'
-        args += " --binary_image " + self.BINARY_SEGMENTATION_FILE + "/exported_data"
+        args = [
+            "--project=" + self.PROJECT_FILE,
+            "--headless",
+            "--export_source=Plugin",
+            "--export_plugin=CSV-Table",
+            "--raw_data",
+            self.RAW_DATA_FILE,  # + '/data'
+            "--binary_image",
+            self.BINARY_SEGMENTATION_FILE + "/exported_data",
+        ]
 
-        sys.argv = ["ilastik.py"]  # Clear the existing commandline args so it looks like we're starting fresh.
-        sys.argv += args.split()
+        sys.argv = ["ilastik.py", *args]  # Clear the existing commandline args so it looks like we're starting fresh.
 
         # Start up the ilastik.py entry script as if we had launched it from the command line
         self.ilastik_startup.main()
@@ -11,6 +11,25 @@ from lazyflow.classifiers.parallelVigraRfLazyflowClassifier import (
 from ..types import ApiTestDataLookup, TestProjects
 
 
+@pytest.fixture(scope="module")
+def open_project(test_data_lookup: ApiTestDataLookup):
+    """
+    Returns a function to open a test project read-only.
+    Each project file is opened once per module, and shared between the parametrized tests.
+    """
+    files = {}
+
+    def _open(proj: TestProjects) -> h5py.File:
+        if proj not in files:
+            files[proj] = h5py.File(test_data_lookup.find_project(proj), "r")
+        return files[proj]
+
+    yield _open
+
+    for f in files.values():
+        f.close()
+
+
 class TestIlastikPixelClassificationParser:
     @pytest.mark.parametrize(
         "proj, expected_num_channels",
@@ -19,10 +38,8 @@ class TestIlastikPixelClassificationParser:
             (TestProjects.PIXEL_CLASS_3_CHANNEL, 3),
         ],
     )
-    def test_parse_project_number_of_channels(self, test_data_lookup: ApiTestDataLookup, proj, expected_num_channels):
-        project_path = test_data_lookup.find_project(proj)
-        with h5py.File(project_path, "r") as f:
-            project = PixelClassificationProject.model_validate(f)
+    def test_parse_project_number_of_channels(self, open_project, proj, expected_num_channels):
+        project = PixelClassificationProject.model_validate(open_project(proj))
 
         assert project.input_data.num_channels == expected_num_channels
 
@@ -36,11 +53,8 @@ class TestIlastikPixelClassificationParser:
             ),
         ],
     )
-    def test_parse_project_classifier(self, test_data_lookup, proj, expected_factory, expected_classifier):
-        project_path = test_data_lookup.find_project(proj)
-
-        with h5py.File(project_path, "r") as f:
-            project = PixelClassificationProject.model_validate(f)
+    def test_parse_project_classifier(self, open_project, proj, expected_factory, expected_classifier):
+        project = PixelClassificationProject.model_validate(open_project(proj))
 
         assert isinstance(project.classifier.classifier_factory, expected_factory)
         assert isinstance(project.classifier.classifier, expected_classifier)
@@ -91,11 +105,8 @@ class TestIlastikPixelClassificationParser:
     ]
 
     @pytest.mark.parametrize("proj, expected_sel_matrix, expected_compute_in_2d", tests)
-    def test_parse_project_features(self, test_data_lookup, proj, expected_sel_matrix, expected_compute_in_2d):
-        project_path = test_data_lookup.find_project(proj)
-
-        with h5py.File(project_path, "r") as f:
-            project = PixelClassificationProject.model_validate(f)
+    def test_parse_project_features(self, open_project, proj, expected_sel_matrix, expected_compute_in_2d):
+        project = PixelClassificationProject.model_validate(open_project(proj))
 
         matrix = project.feature_matrix
         assert matrix
@@ -115,11 +126,8 @@ class TestIlastikAutocontextParser:
             ),
         ],
     )
-    def test_parse_project_classifier(self, test_data_lookup, proj, expected_factory, expected_classifier):
-        project_path = test_data_lookup.find_project(proj)
-
-        with h5py.File(project_path, "r") as f:
-            project: AutocontextProject = AutocontextProject.model_validate(f)
+    def test_parse_project_classifier(self, open_project, proj, expected_factory, expected_classifier):
+        project: AutocontextProject = AutocontextProject.model_validate(open_project(proj))
 
         assert isinstance(project.classifier_stage1.classifier_factory, expected_factory)
         assert isinstance(project.classifier_stage1.classifier, expected_classifier)
@@ -185,17 +193,14 @@ class TestIlastikAutocontextParser:
     )
     def test_parse_project_features(
         self,
-        test_data_lookup,
+        open_project,
         proj,
         expected_sel_matrix_1,
         expected_compute_in_2d_1,
         expected_sel_matrix_2,
         expected_compute_in_2d_2,
     ):
-        project_path = test_data_lookup.find_project(proj)
-
-        with h5py.File(project_path, "r") as f:
-            project: AutocontextProject = AutocontextProject.model_validate(f)
+        project: AutocontextProject = AutocontextProject.model_validate(open_project(proj))
 
         matrix_1 = project.feature_matrix_stage1
         assert matrix_1
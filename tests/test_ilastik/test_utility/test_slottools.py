@@ -1,3 +1,5 @@
+import copy
+
 import pytest
 
 import numpy
@@ -52,3 +54,94 @@ def test_eq(dtype_a, dtype_b, expected):
     fn_b = DtypeConvertFunction(dtype_b)
 
     assert (fn_a == fn_b) == expected
+
+
+def test_float_identity_is_not_copied():
+    data = numpy.linspace(0, 1, 5, dtype="float32")
+    assert DtypeConvertFunction("float32")(data) is data
+
+    # Integer targets still rescale, even when the dtype already matches
+    numpy.testing.assert_array_equal(
+        DtypeConvertFunction("uint8")(numpy.array((0, 1), dtype="uint8")), numpy.array((0, 255), dtype="uint8")
+    )
+
+
+@pytest.mark.parametrize(
+    "input_array,dtype,expected",
+    [
+        # round to nearest instead of truncating
+        (numpy.array((0.4 / 255, 0.6 / 255, 254.6 / 255), dtype="float32"), "uint8", (0, 1, 255)),
+        # saturate instead of wrapping around
+        (numpy.array((-0.5, 1.5)), "uint8", (0, 255)),
+        (numpy.array((2,), dtype="uint32"), "uint8", (255,)),
+        # signed targets span the full range
+        (numpy.array((0.0, 1.0)), "int8", (-128, 127)),
+        (numpy.array((0.0, 0.5, 1.0), dtype="float32"), "int16", (-32768, 0, 32767)),
+        # targets wider than float32's mantissa
+        (numpy.array((0.0, 1.0, 1.5), dtype="float32"), "uint32", (0, 2**32 - 1, 2**32 - 1)),
+        (
+            numpy.array((-0.5, 0.0, 1.0, 1.5), dtype="float32"),
+            "int32",
+            (-(2**31), -(2**31), 2**31 - 1, 2**31 - 1),
+        ),
+        # the largest float64 values not above the maximum
+        (numpy.array((0.0, 1.0, 1.5)), "uint64", (0, 2**64 - 2048, 2**64 - 2048)),
+        (numpy.array((-0.5, 0.0, 1.0)), "int64", (-(2**63), -(2**63), 2**63 - 1024)),
+    ],
+)
+def test_rounding_and_saturation(input_array, dtype, expected):
+    result = DtypeConvertFunction(dtype)(input_array)
+    numpy.testing.assert_array_equal(result, numpy.array(expected, dtype=dtype))
+
+
+def test_dither():
+    data = numpy.full((100_000,), 0.3 / 255)
+
+    truncated = DtypeConvertFunction("uint8")(data)
+    numpy.testing.assert_array_equal(truncated, 0)
+
+    dithered = DtypeConvertFunction("uint8", dither=True)(data)
+    assert dithered.dtype == numpy.uint8
+    assert set(numpy.unique(dithered)) == {0, 1}
+    assert dithered.mean() == pytest.approx(0.3, abs=0.01)
+
+    # Extreme values stay in range
+    numpy.testing.assert_array_equal(
+        DtypeConvertFunction("uint8", dither=True)(numpy.array((0.0, 1.0))), numpy.array((0, 255), dtype="uint8")
+    )
+
+
+def test_dither_eq():
+    assert DtypeConvertFunction("uint8", dither=True) == DtypeConvertFunction("uint8", dither=True)
+    assert DtypeConvertFunction("uint8", dither=True) != DtypeConvertFunction("uint8")
+
+
+def test_no_rescale():
+    data = numpy.array((-1, 0, 1), dtype="int16")
+    result = DtypeConvertFunction("uint16", rescale=False)(data)
+    assert result.dtype == numpy.uint16
+    assert numpy.shares_memory(result, data)
+    numpy.testing.assert_array_equal(result, data.astype("uint16"))
+
+    # Different itemsize or float input is cast, not rescaled
+    numpy.testing.assert_array_equal(
+        DtypeConvertFunction("uint8", rescale=False)(numpy.array((0, 1, 200), dtype="uint16")),
+        numpy.array((0, 1, 200), dtype="uint8"),
+    )
+    numpy.testing.assert_array_equal(
+        DtypeConvertFunction("uint8", rescale=False)(numpy.array((0.0, 1.0, 2.0))),
+        numpy.array((0, 1, 2), dtype="uint8"),
+    )
+
+    assert DtypeConvertFunction("uint16", rescale=False) != DtypeConvertFunction("uint16")
+
+
+def test_instances_are_interned():
+    assert DtypeConvertFunction("uint8") is DtypeConvertFunction(numpy.uint8)
+    assert DtypeConvertFunction("uint8") is not DtypeConvertFunction("uint16")
+    assert len({DtypeConvertFunction("float32"), DtypeConvertFunction(numpy.dtype("float32"))}) == 1
+
+
+def test_copy_preserves_identity():
+    fn = DtypeConvertFunction("uint8")
+    assert copy.deepcopy(fn) is fn
@@ -21,7 +21,6 @@
 
 import h5py
 import ilastik
-import imp
 import itertools
 import logging
 import numpy
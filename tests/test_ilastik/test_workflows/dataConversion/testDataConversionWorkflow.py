@@ -22,7 +22,6 @@ from __future__ import print_function
 ###############################################################################
 import os
 import sys
-import imp
 import numpy
 import tempfile
 
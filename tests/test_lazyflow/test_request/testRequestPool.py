@@ -59,6 +59,26 @@ def test_basic():
     )
 
 
+def test_add_batch():
+    """
+    Check if add_batch adds one request per item, and refuses to add to a started pool.
+    """
+    results = [None] * 100
+
+    def store(i):
+        results[i] = i
+
+    pool = RequestPool()
+    pool.add_batch(store, range(100))
+    assert len(pool) == 100
+    pool.wait()
+
+    assert results == list(range(100))
+
+    with pytest.raises(RequestPool.RequestPoolError):
+        pool.add_batch(store, range(10))
+
+
 @fail_after_timeout(5)
 def test_pool_with_failed_requests():
     """
@@ -117,7 +137,7 @@ def _impl_test_pool_results_discarded():
             Request.global_thread_pool.num_workers
         )
 
-        return numpy.zeros((10,), dtype=numpy.uint8) + 1
+        return numpy.ones((10,), dtype=numpy.uint8)
 
     lock = threading.Lock()
 
@@ -174,7 +194,7 @@ def test_ctx_empty():
 
 
 def test_ctx_work():
-    res = [0] * 10
+    res = numpy.zeros(10, dtype=numpy.int64)
 
     with RequestPool() as pool:
         for i in range(10):
@@ -184,7 +204,7 @@ def test_ctx_work():
     assert pool._finished
     assert not pool._failed
 
-    assert res == list(range(10))
+    numpy.testing.assert_array_equal(res, numpy.arange(10))
 
 
 def test_ctx_exc():